@@ -0,0 +1,32 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# orjson decodes API error bodies faster; the stdlib parser is the fallback
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+# Shared HTTP session for all Yandex SpeechKit calls. Keeps TLS connections
+# to *.api.cloud.yandex.net alive between validation, STT and TTS requests.
+SESSION = requests.Session()
+
+_adapter = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=64,
+    max_retries=Retry(
+        total=2,
+        backoff_factor=0.2,
+        status_forcelist=[502, 503],
+        # Retry POSTs only when the server refused them outright or answered
+        # 502/503; a read error or a 504 gateway timeout may mean the request
+        # is still being processed (and billed), so neither is retried
+        read=False,
+        allowed_methods=None,
+        # Hand the last response back to the caller instead of raising
+        raise_on_status=False,
+    ),
+)
+SESSION.mount("https://", _adapter)
+SESSION.mount("http://", _adapter)
@@ -1,9 +1,33 @@
+import asyncio
+import hashlib
+import re
+import threading
+import time
 from typing import Any
 
+import requests
 from dify_plugin import ToolProvider
 from dify_plugin.errors.tool import ToolProviderCredentialValidationError
 
-from tools.text_to_speech import TextToSpeechTool
+from provider._http import SESSION
+
+_PROBE_URL = "https://tts.api.cloud.yandex.net/speech/v1/tts:synthesize"
+
+# Yandex Cloud API keys are long URL-safe tokens; anything else is a typo
+_API_KEY_RE = re.compile(r"^[A-Za-z0-9_\-]{20,}$")
+
+# Successful validations are remembered per API key hash for this many seconds
+_CACHE_TTL = 43200
+_VALIDATION_CACHE: dict[str, float] = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def clear_validation_cache() -> None:
+    """
+    Forget all remembered credential validations
+    """
+    with _CACHE_LOCK:
+        _VALIDATION_CACHE.clear()
 
 
 class YandexSpeechkitProvider(ToolProvider):
@@ -13,70 +37,63 @@ class YandexSpeechkitProvider(ToolProvider):
 
     def _validate_credentials(self, credentials: dict[str, Any]) -> None:
         """
-        Validate provider credentials by testing the TTS API
+        Validate provider credentials with an auth-only TTS API probe
         """
         api_key = credentials.get("api_key")
-
-        if not api_key:
+        if not (isinstance(api_key, str) and api_key.strip()):
             raise ToolProviderCredentialValidationError("API key is required")
+        api_key = api_key.strip()
 
-        if not isinstance(api_key, str) or len(api_key.strip()) == 0:
-            raise ToolProviderCredentialValidationError("API key is required")
+        if not _API_KEY_RE.match(api_key):
+            raise ToolProviderCredentialValidationError("API key format is invalid")
+
+        # Skip the network probe if this key was validated recently
+        cache_key = hashlib.sha256(api_key.encode()).hexdigest()
+        now = time.monotonic()
+        with _CACHE_LOCK:
+            validated_at = _VALIDATION_CACHE.get(cache_key)
+        if validated_at is not None and now - validated_at < _CACHE_TTL:
+            return
 
-        # Test credentials with a simple TTS request
+        # Probe the TTS endpoint with empty text: the auth layer rejects a bad
+        # key with 401/403, while a valid key gets a cheap 400 without synthesis.
+        # The short error body is read in full so the connection goes back to
+        # the pool for the next TTS or STT call
         try:
-            # Create a TTS tool instance and test with minimal parameters
-            tts_tool = TextToSpeechTool.from_credentials(credentials)
-
-            # Test with a simple text synthesis
-            test_params = {
-                "text": "test",
-                "voice": "marina",
-                "emotion": "neutral",
-                "speed": 1.0,
-                "format": "mp3",
-            }
-
-            # Try to invoke the tool - this will validate the API key
-            result_generator = tts_tool.invoke(tool_parameters=test_params)
-
-            # Process the generator to actually make the API call
-            results = list(result_generator)
-
-            # Check if we got a successful result (should have text and audio blob)
-            if not results:
-                raise ToolProviderCredentialValidationError(
-                    "No response from Yandex SpeechKit API"
-                )
-
-            # Look for error messages in the results
-            for result in results:
-                if hasattr(result, "message") and result.message:
-                    message_text = getattr(result.message, "text", "")
-                    if message_text.startswith("Error:"):
-                        raise ToolProviderCredentialValidationError(
-                            f"API validation failed: {message_text}"
-                        )
-
-        except ToolProviderCredentialValidationError:
-            # Re-raise validation errors
-            raise
-        except Exception as e:
-            # Convert other exceptions to validation errors
-            error_msg = str(e)
-            if "401" in error_msg or "unauthorized" in error_msg.lower():
-                raise ToolProviderCredentialValidationError(
-                    "Invalid API key - unauthorized access"
-                )
-            elif "403" in error_msg or "forbidden" in error_msg.lower():
-                raise ToolProviderCredentialValidationError(
-                    "API key does not have required permissions"
-                )
-            elif "timeout" in error_msg.lower():
-                raise ToolProviderCredentialValidationError(
-                    "API request timeout - please check your connection"
-                )
-            else:
-                raise ToolProviderCredentialValidationError(
-                    f"Credential validation failed: {error_msg}"
-                )
+            response = SESSION.post(
+                _PROBE_URL,
+                headers={"Authorization": f"Api-Key {api_key}"},
+                data={"text": ""},
+                timeout=5,
+            )
+        except requests.Timeout:
+            raise ToolProviderCredentialValidationError(
+                "API request timeout - please check your connection"
+            )
+        except requests.RequestException as e:
+            raise ToolProviderCredentialValidationError(
+                f"Credential validation failed: {e}"
+            )
+
+        status = response.status_code
+        if status == 401:
+            raise ToolProviderCredentialValidationError(
+                "Invalid API key - unauthorized access"
+            )
+        if status == 403:
+            raise ToolProviderCredentialValidationError(
+                "API key does not have required permissions"
+            )
+        if status >= 500:
+            raise ToolProviderCredentialValidationError(
+                f"Credential validation failed: API error: {status}"
+            )
+
+        with _CACHE_LOCK:
+            _VALIDATION_CACHE[cache_key] = now
+
+    async def _validate_credentials_async(self, credentials: dict[str, Any]) -> None:
+        """
+        Validate provider credentials without blocking the event loop
+        """
+        await asyncio.to_thread(self._validate_credentials, credentials)
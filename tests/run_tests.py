@@ -23,12 +23,14 @@ def load_environment():
     """Load environment variables from .env file if it exists"""
     env_file = project_root / ".env"
     if env_file.exists():
-        with open(env_file, "r") as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith("#") and "=" in line:
-                    key, value = line.split("=", 1)
-                    os.environ[key] = value
+        with open(env_file, "r", encoding="utf-8") as f:
+            os.environ.update(
+                (key.strip(), value.strip())
+                for key, sep, value in (
+                    line.partition("=") for line in map(str.strip, f)
+                )
+                if sep and key and not key.startswith("#")
+            )
 
 
 def run_all_tests():
@@ -38,8 +40,12 @@ def run_all_tests():
 
     # Discover tests
     test_dir = Path(__file__).parent
-    loader = unittest.TestLoader()
-    suite = loader.discover(str(test_dir), pattern="test_*.py")
+    # Keep bytecode caching on so repeated runs reuse __pycache__
+    sys.dont_write_bytecode = False
+    os.environ.pop("PYTHONDONTWRITEBYTECODE", None)
+    suite = unittest.defaultTestLoader.discover(
+        str(test_dir), pattern="test_*.py", top_level_dir=str(project_root)
+    )
 
     # Run tests
     runner = unittest.TextTestRunner(
@@ -49,21 +55,24 @@ def run_all_tests():
     result = runner.run(suite)
 
     # Print summary
-    print(f"\n{'=' * 50}")
-    print(f"Tests run: {result.testsRun}")
-    print(f"Failures: {len(result.failures)}")
-    print(f"Errors: {len(result.errors)}")
-    print(f"Skipped: {len(result.skipped) if hasattr(result, 'skipped') else 0}")
+    summary = [
+        f"\n{'=' * 50}\n"
+        f"Tests run: {result.testsRun}\n"
+        f"Failures: {len(result.failures)}\n"
+        f"Errors: {len(result.errors)}\n"
+        f"Skipped: {len(getattr(result, 'skipped', ()))}\n"
+    ]
 
     if result.failures:
-        print("\nFAILURES:")
-        for test, traceback in result.failures:
-            print(f"- {test}: {traceback}")
+        summary.append("\nFAILURES:\n")
+        summary.extend(f"- {test}: {tb}\n" for test, tb in result.failures)
 
     if result.errors:
-        print("\nERRORS:")
-        for test, traceback in result.errors:
-            print(f"- {test}: {traceback}")
+        summary.append("\nERRORS:\n")
+        summary.extend(f"- {test}: {tb}\n" for test, tb in result.errors)
+
+    sys.stdout.write("".join(summary))
+    sys.stdout.flush()
 
     # Return exit code
     return 0 if result.wasSuccessful() else 1
@@ -0,0 +1,80 @@
+import socket
+import threading
+import unittest
+
+import requests
+
+from provider._http import SESSION
+
+
+class TestSharedSession(unittest.TestCase):
+    """Test cases for the shared HTTP session"""
+
+    def serve(self, handler):
+        """Run a one-thread TCP server and return its URL"""
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+        self.addCleanup(server.close)
+        self.requests = []
+
+        def accept_loop():
+            while True:
+                try:
+                    conn, _ = server.accept()
+                except OSError:
+                    return
+                self.addCleanup(conn.close)
+                data = conn.recv(65536)
+                self.requests.append(data)
+                handler(conn)
+
+        threading.Thread(target=accept_loop, daemon=True).start()
+        return f"http://127.0.0.1:{server.getsockname()[1]}/"
+
+    def test_read_timeout_is_not_retried(self):
+        """Test a POST that gets no reply is sent once and raises Timeout"""
+        url = self.serve(lambda conn: None)
+
+        with self.assertRaises(requests.Timeout):
+            SESSION.post(url, data=b"audio", timeout=(1, 0.5))
+
+        self.assertEqual(len(self.requests), 1)
+
+    def test_unavailable_is_retried(self):
+        """Test a 503 answer is retried until the server recovers"""
+        responses = iter(
+            [
+                b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\n\r\n",
+                b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok",
+            ]
+        )
+
+        def reply(conn):
+            conn.sendall(next(responses))
+            conn.close()
+
+        url = self.serve(reply)
+
+        response = SESSION.post(url, data=b"audio", timeout=(1, 1))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.requests), 2)
+
+    def test_gateway_timeout_is_not_retried(self):
+        """Test a 504 answer is returned without sending the POST again"""
+
+        def reply(conn):
+            conn.sendall(b"HTTP/1.1 504 Gateway Timeout\r\nContent-Length: 0\r\n\r\n")
+            conn.close()
+
+        url = self.serve(reply)
+
+        response = SESSION.post(url, data=b"audio", timeout=(1, 1))
+
+        self.assertEqual(response.status_code, 504)
+        self.assertEqual(len(self.requests), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
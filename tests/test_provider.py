@@ -1,18 +1,29 @@
+import asyncio
 import unittest
 from unittest.mock import MagicMock, patch
 
+import requests
 from dify_plugin.errors.tool import ToolProviderCredentialValidationError
 
-from provider.yandex_speechkit import YandexSpeechkitProvider
+from provider._http import SESSION
+from provider.yandex_speechkit import (
+    YandexSpeechkitProvider,
+    clear_validation_cache,
+)
 
 
 class TestYandexSpeechkitProvider(unittest.TestCase):
     """Test cases for YandexSpeechkitProvider"""
 
+    @classmethod
+    def setUpClass(cls):
+        """Set up test fixtures shared by all tests"""
+        cls.provider = YandexSpeechkitProvider()
+        cls.valid_credentials = {"api_key": "AQVN-test-api-key-0123456789"}
+
     def setUp(self):
-        """Set up test fixtures"""
-        self.provider = YandexSpeechkitProvider()
-        self.valid_credentials = {"api_key": "test-api-key"}
+        """Start every test with an empty validation cache"""
+        clear_validation_cache()
 
     def test_validate_credentials_missing_api_key(self):
         """Test validation with missing API key"""
@@ -41,15 +52,24 @@ class TestYandexSpeechkitProvider(unittest.TestCase):
 
         self.assertIn("API key is required", str(context.exception))
 
-    @patch("tools.text_to_speech.TextToSpeechTool.from_credentials")
-    def test_validate_credentials_successful(self, mock_from_credentials):
+    @patch.object(SESSION, "post")
+    def test_validate_credentials_malformed_api_key(self, mock_post):
+        """Test validation rejects a malformed API key without calling the API"""
+        credentials = {"api_key": "not a key"}
+
+        with self.assertRaises(ToolProviderCredentialValidationError) as context:
+            self.provider._validate_credentials(credentials)
+
+        self.assertIn("API key format is invalid", str(context.exception))
+        mock_post.assert_not_called()
+
+    @patch.object(SESSION, "post")
+    def test_validate_credentials_successful(self, mock_post):
         """Test successful credential validation"""
-        # Mock successful TTS tool creation and invocation
-        mock_tool = MagicMock()
-        mock_result = MagicMock()
-        mock_result.message.text = "Speech synthesis completed successfully!"
-        mock_tool.invoke.return_value = [mock_result]
-        mock_from_credentials.return_value = mock_tool
+        # A valid key passes auth and fails only on the empty probe text
+        mock_response = MagicMock()
+        mock_response.status_code = 400
+        mock_post.return_value = mock_response
 
         # Should not raise an exception
         try:
@@ -59,50 +79,74 @@ class TestYandexSpeechkitProvider(unittest.TestCase):
                 "_validate_credentials raised ToolProviderCredentialValidationError unexpectedly!"
             )
 
-    @patch("tools.text_to_speech.TextToSpeechTool.from_credentials")
-    def test_validate_credentials_api_error(self, mock_from_credentials):
-        """Test credential validation with API error"""
-        # Mock TTS tool that returns error
-        mock_tool = MagicMock()
-        mock_result = MagicMock()
-        mock_result.message.text = "Error: API error: 401 - Invalid API key"
-        mock_tool.invoke.return_value = [mock_result]
-        mock_from_credentials.return_value = mock_tool
+        # Probe must not request any actual synthesis
+        call_args = mock_post.call_args
+        self.assertEqual(call_args[1]["data"], {"text": ""})
+        self.assertNotIn("stream", call_args[1])
+
+    @patch.object(SESSION, "post")
+    def test_validate_credentials_cached(self, mock_post):
+        """Test repeated validation of the same key skips the API probe"""
+        mock_response = MagicMock()
+        mock_response.status_code = 400
+        mock_post.return_value = mock_response
+
+        self.provider._validate_credentials(self.valid_credentials)
+        self.provider._validate_credentials(self.valid_credentials)
+
+        mock_post.assert_called_once()
+
+    @patch.object(SESSION, "post")
+    def test_validate_credentials_async(self, mock_post):
+        """Test concurrent async validation of several keys"""
+        mock_response = MagicMock()
+        mock_response.status_code = 400
+        mock_post.return_value = mock_response
+
+        async def validate_all():
+            await asyncio.gather(
+                self.provider._validate_credentials_async(
+                    {"api_key": "AQVN-test-api-key-one-0123"}
+                ),
+                self.provider._validate_credentials_async(
+                    {"api_key": "AQVN-test-api-key-two-0123"}
+                ),
+            )
 
-        with self.assertRaises(ToolProviderCredentialValidationError) as context:
-            self.provider._validate_credentials(self.valid_credentials)
+        asyncio.run(validate_all())
 
-        self.assertIn("API validation failed", str(context.exception))
+        self.assertEqual(mock_post.call_count, 2)
 
-    @patch("tools.text_to_speech.TextToSpeechTool.from_credentials")
-    def test_validate_credentials_no_response(self, mock_from_credentials):
-        """Test credential validation with no response"""
-        # Mock TTS tool that returns empty result
-        mock_tool = MagicMock()
-        mock_tool.invoke.return_value = []
-        mock_from_credentials.return_value = mock_tool
+    @patch.object(SESSION, "post")
+    def test_validate_credentials_server_error(self, mock_post):
+        """Test credential validation with server error"""
+        mock_response = MagicMock()
+        mock_response.status_code = 503
+        mock_post.return_value = mock_response
 
         with self.assertRaises(ToolProviderCredentialValidationError) as context:
             self.provider._validate_credentials(self.valid_credentials)
 
-        self.assertIn("No response from Yandex SpeechKit API", str(context.exception))
+        self.assertIn("API error: 503", str(context.exception))
 
-    @patch("tools.text_to_speech.TextToSpeechTool.from_credentials")
-    def test_validate_credentials_unauthorized_error(self, mock_from_credentials):
+    @patch.object(SESSION, "post")
+    def test_validate_credentials_unauthorized_error(self, mock_post):
         """Test credential validation with 401 error"""
-        # Mock TTS tool that raises exception with 401 error
-        mock_from_credentials.side_effect = Exception("HTTP 401 Unauthorized")
+        mock_response = MagicMock()
+        mock_response.status_code = 401
+        mock_post.return_value = mock_response
 
         with self.assertRaises(ToolProviderCredentialValidationError) as context:
             self.provider._validate_credentials(self.valid_credentials)
 
         self.assertIn("Invalid API key - unauthorized access", str(context.exception))
 
-    @patch("tools.text_to_speech.TextToSpeechTool.from_credentials")
-    def test_validate_credentials_forbidden_error(self, mock_from_credentials):
+    @patch.object(SESSION, "post")
+    def test_validate_credentials_forbidden_error(self, mock_post):
         """Test credential validation with 403 error"""
-        # Mock TTS tool that raises exception with 403 error
-        mock_from_credentials.side_effect = Exception("HTTP 403 Forbidden")
+        mock_response = MagicMock()
+        mock_response.status_code = 403
+        mock_post.return_value = mock_response
 
         with self.assertRaises(ToolProviderCredentialValidationError) as context:
             self.provider._validate_credentials(self.valid_credentials)
@@ -111,22 +155,22 @@ class TestYandexSpeechkitProvider(unittest.TestCase):
             "API key does not have required permissions", str(context.exception)
         )
 
-    @patch("tools.text_to_speech.TextToSpeechTool.from_credentials")
-    def test_validate_credentials_timeout_error(self, mock_from_credentials):
+    @patch.object(SESSION, "post")
+    def test_validate_credentials_timeout_error(self, mock_post):
         """Test credential validation with timeout error"""
-        # Mock TTS tool that raises timeout exception
-        mock_from_credentials.side_effect = Exception("Request timeout")
+        # Mock request that raises timeout exception
+        mock_post.side_effect = requests.Timeout("Request timeout")
 
         with self.assertRaises(ToolProviderCredentialValidationError) as context:
             self.provider._validate_credentials(self.valid_credentials)
 
         self.assertIn("API request timeout", str(context.exception))
 
-    @patch("tools.text_to_speech.TextToSpeechTool.from_credentials")
-    def test_validate_credentials_generic_error(self, mock_from_credentials):
+    @patch.object(SESSION, "post")
+    def test_validate_credentials_generic_error(self, mock_post):
         """Test credential validation with generic error"""
-        # Mock TTS tool that raises generic exception
-        mock_from_credentials.side_effect = Exception("Some generic error")
+        # Mock request that raises generic network exception
+        mock_post.side_effect = requests.ConnectionError("Some generic error")
 
         with self.assertRaises(ToolProviderCredentialValidationError) as context:
             self.provider._validate_credentials(self.valid_credentials)
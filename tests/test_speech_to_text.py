@@ -1,71 +1,135 @@
+import json
 import os
 import struct
 import unittest
-import wave
 from io import BytesIO
 from unittest.mock import MagicMock, patch
 
-from tools.speech_to_text import SpeechToTextTool
+from provider._http import SESSION
+from tools.speech_to_text import SpeechToTextTool, _parse_wav_inplace
 
 
 class TestSpeechToTextTool(unittest.TestCase):
     """Test cases for SpeechToTextTool"""
 
+    @classmethod
+    def setUpClass(cls):
+        """Build the shared test audio once for the whole class"""
+        cls._TEST_WAV = cls.create_test_wav()
+
     def setUp(self):
         """Set up test fixtures"""
         self.api_key = os.getenv("YANDEX_API_KEY", "test-api-key")
         self.credentials = {"api_key": self.api_key}
         self.tool = SpeechToTextTool.from_credentials(self.credentials)
 
-    def create_test_wav(self, duration=1.0, sample_rate=16000, frequency=440):
+    @staticmethod
+    def create_test_wav(duration=1.0, sample_rate=16000, frequency=440):
         """Create a test WAV file with a sine wave"""
         frames = int(duration * sample_rate)
-        wav_buffer = BytesIO()
-
-        with wave.open(wav_buffer, "wb") as wav_file:
-            wav_file.setnchannels(1)  # Mono
-            wav_file.setsampwidth(2)  # 16-bit
-            wav_file.setframerate(sample_rate)
-
-            # Generate sine wave
-            for i in range(frames):
-                value = int(
-                    32767
-                    * 0.3
-                    * (i % (sample_rate // frequency))
-                    / (sample_rate // frequency)
-                )
-                wav_file.writeframes(struct.pack("<h", value))
-
-        wav_buffer.seek(0)
-        return wav_buffer.getvalue()
+        period = sample_rate // frequency
+
+        # The waveform is periodic: pack one period and tile it
+        one_period = struct.pack(
+            f"<{period}h", *(int(32767 * 0.3 * i / period) for i in range(period))
+        )
+        full, rest = divmod(frames, period)
+        samples = one_period * full + one_period[: rest * 2]
+
+        # Canonical 44-byte header for mono 16-bit PCM
+        header = struct.pack(
+            "<4sI4s4sIHHIIHH4sI",
+            b"RIFF",
+            36 + len(samples),
+            b"WAVE",
+            b"fmt ",
+            16,
+            1,  # PCM
+            1,  # Mono
+            sample_rate,
+            sample_rate * 2,  # Byte rate
+            2,  # Block align
+            16,  # 16-bit
+            b"data",
+            len(samples),
+        )
+        return header + samples
 
     def test_convert_wav_to_pcm(self):
         """Test WAV to PCM conversion"""
-        wav_data = self.create_test_wav()
+        wav_data = self._TEST_WAV
         pcm_data, sample_rate = self.tool._convert_wav_to_pcm(wav_data)
 
         self.assertIsInstance(pcm_data, bytes)
         self.assertEqual(sample_rate, 16000)
         self.assertGreater(len(pcm_data), 0)
 
+    def test_fast_wav_parse(self):
+        """Test LPCM-compatible WAV is parsed without conversion"""
+        result = self.tool._fast_wav_parse(self._TEST_WAV)
+
+        self.assertIsNotNone(result)
+        pcm_data, sample_rate = result
+        self.assertEqual(sample_rate, 16000)
+        self.assertEqual(pcm_data, self._TEST_WAV[44:])
+
+        # Non-WAV and unsupported rates fall back to full conversion
+        self.assertIsNone(self.tool._fast_wav_parse(b"ID3" + b"\x00" * 64))
+        self.assertIsNone(
+            self.tool._fast_wav_parse(self.create_test_wav(sample_rate=22050))
+        )
+
+    def test_parse_wav_inplace(self):
+        """Test WAV header parsing returns a view of the PCM payload"""
+        info = _parse_wav_inplace(self._TEST_WAV)
+
+        self.assertEqual(info["rate"], 16000)
+        self.assertEqual(info["width"], 2)
+        self.assertEqual(info["channels"], 1)
+        self.assertIsInstance(info["pcm"], memoryview)
+        self.assertEqual(info["pcm"], self._TEST_WAV[44:])
+
+        # Truncated headers are rejected instead of raising
+        self.assertIsNone(_parse_wav_inplace(self._TEST_WAV[:30]))
+
+    def test_normalize_gain(self):
+        """Test quiet audio is amplified by its peak without clipping"""
+        quiet = struct.pack("<4h", 0, 1000, -8000, 8191)
+        self.assertEqual(
+            struct.unpack("<4h", self.tool._normalize_gain(quiet)),
+            (0, 4000, -32000, 32764),
+        )
+
+        medium = struct.pack("<2h", 10000, -16383)
+        self.assertEqual(
+            struct.unpack("<2h", self.tool._normalize_gain(medium)),
+            (20000, -32766),
+        )
+
+        # Loud audio and silence are passed through unchanged
+        loud = struct.pack("<2h", 100, -32768)
+        self.assertEqual(self.tool._normalize_gain(loud), loud)
+        silence = bytes(8)
+        self.assertEqual(self.tool._normalize_gain(silence), silence)
+
     def test_convert_audio_formats(self):
         """Test audio format conversion"""
         # Test with WAV data
-        wav_data = self.create_test_wav()
+        wav_data = self._TEST_WAV
 
         try:
             # This requires pydub to be installed
-            converted_wav = self.tool._convert_audio_to_wav(wav_data)
-            self.assertIsInstance(converted_wav, bytes)
-            self.assertGreater(len(converted_wav), 0)
+            pcm_data, sample_rate = self.tool._decode_to_pcm(wav_data)
+            self.assertIsInstance(pcm_data, bytes)
+            self.assertEqual(sample_rate, 16000)
+            self.assertGreater(len(pcm_data), 0)
         except ValueError as e:
             if "Audio conversion library not available" in str(e):
                 self.skipTest("pydub not available for testing")
             else:
                 raise
 
-    @patch("requests.post")
+    @patch.object(SESSION, "post")
     def test_successful_recognition(self, mock_post):
         """Test successful speech recognition"""
         # Mock successful API response
@@ -76,7 +140,7 @@ class TestSpeechToTextTool(unittest.TestCase):
 
         # Test parameters
         test_params = {
-            "audio_file": BytesIO(self.create_test_wav()),
+            "audio_file": BytesIO(self._TEST_WAV),
             "language": "ru-RU",
             "topic": "general",
         }
@@ -90,7 +154,7 @@ class TestSpeechToTextTool(unittest.TestCase):
         self.assertTrue(hasattr(result, "message"))
         self.assertEqual(result.message.text, "тестовый текст")
 
-    @patch("requests.post")
+    @patch.object(SESSION, "post")
     def test_no_speech_detected(self, mock_post):
         """Test handling of no speech detected"""
         # Mock API response with empty result
@@ -100,7 +164,7 @@ class TestSpeechToTextTool(unittest.TestCase):
         mock_post.return_value = mock_response
 
         test_params = {
-            "audio_file": BytesIO(self.create_test_wav()),
+            "audio_file": BytesIO(self._TEST_WAV),
             "language": "ru-RU",
             "topic": "general",
         }
@@ -111,17 +175,19 @@ class TestSpeechToTextTool(unittest.TestCase):
         result = results[0]
         self.assertEqual(result.message.text, "No speech detected in the audio file")
 
-    @patch("requests.post")
+    @patch.object(SESSION, "post")
     def test_api_error_handling(self, mock_post):
         """Test API error handling"""
         # Mock API error response
         mock_response = MagicMock()
         mock_response.status_code = 401
-        mock_response.json.return_value = {"error": {"message": "Invalid API key"}}
+        mock_response.content = json.dumps(
+            {"error": {"message": "Invalid API key"}}
+        ).encode()
         mock_post.return_value = mock_response
 
         test_params = {
-            "audio_file": BytesIO(self.create_test_wav()),
+            "audio_file": BytesIO(self._TEST_WAV),
             "language": "ru-RU",
             "topic": "general",
         }
@@ -132,6 +198,43 @@ class TestSpeechToTextTool(unittest.TestCase):
         result = results[0]
         self.assertIn("API error: 401", result.message.text)
 
+    @patch.object(SESSION, "post")
+    def test_oversize_audio_rejected(self, mock_post):
+        """Test audio over the API limits is rejected before upload"""
+        test_params = {
+            "audio_file": BytesIO(self.create_test_wav(duration=40.0)),
+            "language": "ru-RU",
+            "topic": "general",
+        }
+
+        with self.assertRaises(Exception) as context:
+            list(self.tool._invoke(test_params))
+
+        self.assertIn("Audio is too long", str(context.exception))
+        mock_post.assert_not_called()
+
+    @patch.object(SESSION, "post")
+    def test_high_rate_audio_resampled_to_fit(self, mock_post):
+        """Test 48kHz audio over the size limit is sent at 16kHz"""
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {"result": "тест"}
+        mock_post.return_value = mock_response
+
+        test_params = {
+            "audio_file": BytesIO(
+                self.create_test_wav(duration=20.0, sample_rate=48000)
+            ),
+            "language": "ru-RU",
+            "topic": "general",
+        }
+
+        list(self.tool._invoke(test_params))
+
+        call_kwargs = mock_post.call_args[1]
+        self.assertEqual(call_kwargs["params"]["sampleRateHertz"], "16000")
+        self.assertLessEqual(len(call_kwargs["data"]), 1 << 20)
+
     def test_missing_audio_file(self):
         """Test handling of missing audio file"""
         test_params = {"language": "ru-RU", "topic": "general"}
@@ -146,7 +249,7 @@ class TestSpeechToTextTool(unittest.TestCase):
         """Test handling of missing API key"""
         tool_without_key = SpeechToTextTool.from_credentials({})
         test_params = {
-            "audio_file": BytesIO(self.create_test_wav()),
+            "audio_file": BytesIO(self._TEST_WAV),
             "language": "ru-RU",
             "topic": "general",
         }
@@ -161,15 +264,18 @@ class TestSpeechToTextTool(unittest.TestCase):
         """Test different language parameters"""
         test_languages = ["ru-RU", "en-US", "tr-TR", "uk-UA"]
 
+        # _invoke only read()s the file, so one buffer can be rewound
+        audio_buffer = BytesIO(self._TEST_WAV)
+        mock_response = MagicMock(status_code=200)
+        mock_response.json.return_value = {"result": "test result"}
+
         for lang in test_languages:
-            with patch("requests.post") as mock_post:
-                mock_response = MagicMock()
-                mock_response.status_code = 200
-                mock_response.json.return_value = {"result": "test result"}
+            with self.subTest(lang=lang), patch.object(SESSION, "post") as mock_post:
                 mock_post.return_value = mock_response
 
+                audio_buffer.seek(0)
                 test_params = {
-                    "audio_file": BytesIO(self.create_test_wav()),
+                    "audio_file": audio_buffer,
                     "language": lang,
                     "topic": "general",
                 }
@@ -185,15 +291,18 @@ class TestSpeechToTextTool(unittest.TestCase):
         """Test different topic parameters"""
         test_topics = ["general", "maps", "dates", "names", "numbers"]
 
+        # _invoke only read()s the file, so one buffer can be rewound
+        audio_buffer = BytesIO(self._TEST_WAV)
+        mock_response = MagicMock(status_code=200)
+        mock_response.json.return_value = {"result": "test result"}
+
         for topic in test_topics:
-            with patch("requests.post") as mock_post:
-                mock_response = MagicMock()
-                mock_response.status_code = 200
-                mock_response.json.return_value = {"result": "test result"}
+            with self.subTest(topic=topic), patch.object(SESSION, "post") as mock_post:
                 mock_post.return_value = mock_response
 
+                audio_buffer.seek(0)
                 test_params = {
-                    "audio_file": BytesIO(self.create_test_wav()),
+                    "audio_file": audio_buffer,
                     "language": "ru-RU",
                     "topic": topic,
                 }
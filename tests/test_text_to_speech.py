@@ -1,18 +1,37 @@
+import asyncio
+import json
 import os
+import socket
+import tempfile
+import threading
+import time
 import unittest
 from unittest.mock import MagicMock, patch
 
+from provider._http import SESSION
+from tools import _tts_cache as tts_cache
+from tools import text_to_speech
 from tools.text_to_speech import TextToSpeechTool
 
 
 class TestTextToSpeechTool(unittest.TestCase):
     """Test cases for TextToSpeechTool"""
 
+    @classmethod
+    def setUpClass(cls):
+        """Build the tool once for the whole class"""
+        cls.api_key = os.getenv("YANDEX_API_KEY", "test-api-key")
+        cls.credentials = {"api_key": cls.api_key}
+        cls.tool = TextToSpeechTool.from_credentials(cls.credentials)
+
     def setUp(self):
-        """Set up test fixtures"""
-        self.api_key = os.getenv("YANDEX_API_KEY", "test-api-key")
-        self.credentials = {"api_key": self.api_key}
-        self.tool = TextToSpeechTool.from_credentials(self.credentials)
+        """Keep the audio cache isolated per test"""
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        cache_dir_patcher = patch.object(tts_cache, "CACHE_DIR", cache_dir.name)
+        cache_dir_patcher.start()
+        self.addCleanup(cache_dir_patcher.stop)
+        tts_cache.clear()
 
     def test_validate_parameters_success(self):
         """Test successful parameter validation"""
@@ -32,6 +51,46 @@ class TestTextToSpeechTool(unittest.TestCase):
         self.assertEqual(result["speed"], "1.0")
         self.assertEqual(result["format"], "mp3")
 
+    def test_validate_parameters_low_latency(self):
+        """Test low latency mode forces MP3 output"""
+        result = self.tool._validate_parameters(
+            {"text": "Тестовый текст", "format": "opus", "low_latency": True}
+        )
+
+        self.assertEqual(result["format"], "mp3")
+
+    def test_validate_parameters_defaults_fast_path(self):
+        """Test default options skip the validator with the same result"""
+        TextToSpeechTool._validate_core.cache_clear()
+
+        result = self.tool._validate_parameters(
+            {"text": " Тестовый текст ", "speed": 1}
+        )
+
+        self.assertEqual(
+            result,
+            {
+                "text": "Тестовый текст",
+                "voice": "marina",
+                "emotion": "neutral",
+                "speed": "1.0",
+                "format": "mp3",
+            },
+        )
+        self.assertEqual(TextToSpeechTool._validate_core.cache_info().misses, 0)
+
+    def test_validate_parameters_memoized(self):
+        """Test validation is memoized independently of the text content"""
+        base = {"voice": "alena", "emotion": "good", "speed": 1.5}
+        TextToSpeechTool._validate_core.cache_clear()
+
+        first = self.tool._validate_parameters({**base, "text": "Первый"})
+        second = self.tool._validate_parameters({**base, "text": "Второй"})
+
+        self.assertEqual(first["text"], "Первый")
+        self.assertEqual(second["text"], "Второй")
+        self.assertEqual(TextToSpeechTool._validate_core.cache_info().hits, 1)
+
     def test_validate_parameters_empty_text(self):
         """Test validation with empty text"""
         test_params = {
@@ -92,6 +151,17 @@ class TestTextToSpeechTool(unittest.TestCase):
 
         self.assertIn("Invalid emotion", str(context.exception))
 
+    def test_validate_parameters_emotion_not_supported_by_voice(self):
+        """Test validation rejects an emotion the voice cannot express"""
+        test_params = {"text": "Тестовый текст", "voice": "filipp", "emotion": "good"}
+
+        with self.assertRaises(ValueError) as context:
+            self.tool._validate_parameters(test_params)
+
+        self.assertIn(
+            "Emotion 'good' is not supported by voice 'filipp'", str(context.exception)
+        )
+
     def test_validate_parameters_invalid_speed(self):
         """Test validation with invalid speed"""
         test_params = {
@@ -122,13 +192,13 @@ class TestTextToSpeechTool(unittest.TestCase):
 
         self.assertIn("Invalid format", str(context.exception))
 
-    @patch("requests.post")
+    @patch.object(SESSION, "post")
     def test_successful_synthesis(self, mock_post):
         """Test successful text-to-speech synthesis"""
         # Mock successful API response
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.content = b"fake_audio_data"
+        mock_response.iter_content.return_value = [b"fake_audio_data"]
         mock_post.return_value = mock_response
 
         test_params = {
@@ -157,13 +227,265 @@ class TestTextToSpeechTool(unittest.TestCase):
         self.assertTrue(hasattr(blob_result, "message"))
         self.assertEqual(blob_result.message.blob, b"fake_audio_data")
 
-    @patch("requests.post")
+    @patch.object(SESSION, "post")
+    def test_streamed_response_is_joined(self, mock_post):
+        """Test streamed audio chunks are joined into one blob"""
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.iter_content.return_value = [b"fake_", b"", b"audio_data"]
+        mock_post.return_value = mock_response
+
+        # Missing, exact and wrong Content-Length values give the same audio
+        for content_length in (None, "15", "4", "64"):
+            with self.subTest(content_length=content_length):
+                tts_cache.clear()
+                mock_response.headers = (
+                    {"Content-Length": content_length} if content_length else {}
+                )
+
+                results = list(self.tool._invoke({"text": f"Тест {content_length}"}))
+
+                self.assertTrue(mock_post.call_args[1]["stream"])
+                self.assertEqual(results[1].message.blob, b"fake_audio_data")
+
+    def test_stalled_response_body_times_out(self):
+        """Test a body that stalls mid-download is reported as a timeout"""
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+        self.addCleanup(server.close)
+
+        def stall():
+            conn, _ = server.accept()
+            self.addCleanup(conn.close)
+            conn.recv(65536)
+            # Promise more audio than is ever sent
+            conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: 100\r\n\r\nfake_")
+
+        threading.Thread(target=stall, daemon=True).start()
+        url = f"http://127.0.0.1:{server.getsockname()[1]}/"
+
+        with patch.object(text_to_speech, "_TTS_URL", url), patch.object(
+            text_to_speech, "REQUEST_TIMEOUT", (1, 0.5)
+        ):
+            with self.assertRaises(Exception) as context:
+                list(self.tool._invoke({"text": "Тест задержки"}))
+
+        self.assertIn("Request timeout", str(context.exception))
+
+    @patch.object(SESSION, "post")
+    def test_ssml_text(self, mock_post):
+        """Test SSML documents are sent in the ssml field"""
+        mock_post.return_value = self._ok_response()
+        ssml = "\n  <speak>Привет</speak>"
+
+        list(self.tool._invoke({"text": ssml}))
+
+        data = mock_post.call_args[1]["data"]
+        self.assertEqual(data["ssml"], ssml.strip())
+        self.assertNotIn("text", data)
+
+    @patch.object(SESSION, "post")
+    def test_cache_is_scoped_to_api_key(self, mock_post):
+        """Test cached audio is not served to a different API key"""
+        mock_post.return_value = self._ok_response()
+        other_tool = TextToSpeechTool.from_credentials({"api_key": "other-api-key"})
+        test_params = {"text": "Тестовый текст"}
+
+        list(self.tool._invoke(test_params))
+        list(other_tool._invoke(test_params))
+
+        self.assertEqual(mock_post.call_count, 2)
+
+    def test_disk_cache_can_be_disabled(self):
+        """Test audio stays in memory only when the disk tier is off"""
+        with patch.object(tts_cache, "DISK_ENABLED", False):
+            tts_cache.put("memory-only", "mp3", b"audio")
+            self.assertEqual(tts_cache.get("memory-only", "mp3"), b"audio")
+
+            tts_cache.clear()
+            self.assertIsNone(tts_cache.get("memory-only", "mp3"))
+
+        self.assertFalse(os.listdir(tts_cache.CACHE_DIR))
+
+    @patch.object(SESSION, "post")
+    def test_repeated_synthesis_uses_cache(self, mock_post):
+        """Test identical requests are served from the audio cache"""
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.iter_content.return_value = [b"fake_audio_data"]
+        mock_post.return_value = mock_response
+
+        test_params = {
+            "text": "Тестовый текст",
+            "voice": "marina",
+            "emotion": "neutral",
+            "speed": 1.0,
+            "format": "mp3",
+        }
+
+        list(self.tool._invoke(test_params))
+
+        # Memory tier
+        results = list(self.tool._invoke(test_params))
+        self.assertEqual(results[1].message.blob, b"fake_audio_data")
+
+        # Disk tier
+        tts_cache.clear()
+        results = list(self.tool._invoke(test_params))
+        self.assertEqual(results[1].message.blob, b"fake_audio_data")
+
+        mock_post.assert_called_once()
+
+    def test_memory_cache_bounded_by_size(self):
+        """Test the memory cache evicts least recently used audio by total size"""
+        with patch.object(tts_cache, "MEMORY_MAX_BYTES", 20):
+            tts_cache.put("old", "mp3", b"0123456789")
+            tts_cache.put("hot", "mp3", b"0123456789")
+            tts_cache.get("old", "mp3")
+            tts_cache.put("new", "mp3", b"0123456789")
+
+            self.assertEqual(list(tts_cache._MEMORY_CACHE), ["old", "new"])
+            self.assertEqual(tts_cache._memory_bytes, 20)
+
+    def test_disk_cache_evicts_least_recently_used(self):
+        """Test the disk cache is trimmed to its size budget in LRU order"""
+        with patch.object(tts_cache, "DISK_MAX_BYTES", 20):
+            tts_cache.put("aa-old", "mp3", b"0123456789")
+            tts_cache.put("bb-hot", "mp3", b"0123456789")
+            old_path = tts_cache._disk_path("aa-old", "mp3")
+            hot_path = tts_cache._disk_path("bb-hot", "mp3")
+            now = time.time()
+            os.utime(old_path, (now - 20, now - 20))
+            os.utime(hot_path, (now - 10, now - 10))
+
+            # A disk hit marks the entry as recently used
+            tts_cache.clear()
+            self.assertIsNotNone(tts_cache.get("bb-hot", "mp3"))
+
+            tts_cache.put("cc-new", "mp3", b"0123456789")
+
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(os.path.exists(hot_path))
+        self.assertTrue(os.path.exists(tts_cache._disk_path("cc-new", "mp3")))
+
+    @patch.object(SESSION, "post")
+    def test_batch_synthesis(self, mock_post):
+        """Test a batch of texts is synthesized and returned in order"""
+        responses = {}
+        for word in ("Один", "Два", "Три"):
+            response = MagicMock(status_code=200)
+            response.iter_content.return_value = [word.encode()]
+            responses[word] = response
+        mock_post.side_effect = lambda *args, **kwargs: responses[
+            kwargs["data"]["text"]
+        ]
+
+        async def synthesize_in_loop():
+            return await self.tool._synthesize_many_async(
+                [{"text": "Один"}, {"text": "Два"}, {"text": "Три"}]
+            )
+
+        audio = asyncio.run(synthesize_in_loop())
+
+        self.assertEqual(audio, ["Один".encode(), "Два".encode(), "Три".encode()])
+        self.assertEqual(mock_post.call_count, 3)
+
+    def test_split_text(self):
+        """Test long text is split into whole-sentence chunks"""
+        text = " ".join(f"Предложение номер {i}." for i in range(200))
+
+        chunks = self.tool._split_text(text, max_chars=500)
+
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(chunk) <= 500 for chunk in chunks))
+        self.assertTrue(all(chunk.endswith(".") for chunk in chunks))
+        self.assertEqual(" ".join(chunks), text)
+
+        # Line breaks end a chunk candidate even without punctuation
+        self.assertEqual(
+            self.tool._split_text("Первая строка\nВторая строка", max_chars=15),
+            ["Первая строка", "Вторая строка"],
+        )
+
+    @patch.object(SESSION, "post")
+    def test_long_text_parallel_synthesis(self, mock_post):
+        """Test long text is synthesized in chunks and joined in order"""
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.iter_content.return_value = [b"part"]
+        mock_post.return_value = mock_response
+
+        test_params = {
+            "text": " ".join(f"Предложение номер {i}." for i in range(200)),
+            "voice": "marina",
+            "emotion": "neutral",
+            "speed": 1.0,
+            "format": "mp3",
+        }
+
+        results = list(self.tool._invoke(test_params))
+
+        call_count = mock_post.call_count
+        self.assertGreater(call_count, 1)
+        self.assertEqual(results[1].message.blob, b"part" * call_count)
+
+    @patch.object(SESSION, "post")
+    def test_long_text_auth_error_not_retried(self, mock_post):
+        """Test a rejected key fails long synthesis without a whole-text retry"""
+        mock_response = MagicMock()
+        mock_response.status_code = 401
+        mock_response.content = b'{"message": "Invalid API key"}'
+        mock_post.return_value = mock_response
+
+        test_params = {"text": " ".join(f"Предложение номер {i}." for i in range(200))}
+
+        with self.assertRaises(Exception) as context:
+            list(self.tool._invoke(test_params))
+
+        self.assertIn("API error: 401", str(context.exception))
+        chunks = len(self.tool._split_text(test_params["text"]))
+        self.assertLess(mock_post.call_count, chunks)
+
+    @patch.object(SESSION, "post")
+    def test_long_text_server_error_falls_back(self, mock_post):
+        """Test a 5xx chunk failure retries the whole text as one request"""
+        error_response = MagicMock(status_code=503, content=b"")
+        ok_response = self._ok_response()
+        mock_post.side_effect = lambda *args, **kwargs: (
+            ok_response if len(kwargs["data"]["text"]) > 1000 else error_response
+        )
+
+        test_params = {"text": " ".join(f"Предложение номер {i}." for i in range(60))}
+
+        results = list(self.tool._invoke(test_params))
+
+        self.assertEqual(results[1].message.blob, b"fake_audio_data")
+
+    @patch.object(SESSION, "post")
+    def test_long_text_opus_single_request(self, mock_post):
+        """Test long Opus text is not split, as Ogg pages cannot be joined"""
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.iter_content.return_value = [b"ogg"]
+        mock_post.return_value = mock_response
+
+        test_params = {
+            "text": " ".join(f"Предложение номер {i}." for i in range(200)),
+            "format": "opus",
+        }
+
+        list(self.tool._invoke(test_params))
+
+        mock_post.assert_called_once()
+
+    @patch.object(SESSION, "post")
     def test_api_error_handling(self, mock_post):
         """Test API error handling"""
         # Mock API error response
         mock_response = MagicMock()
         mock_response.status_code = 401
-        mock_response.json.return_value = {"message": "Invalid API key"}
+        mock_response.content = json.dumps({"message": "Invalid API key"}).encode()
         mock_post.return_value = mock_response
 
         test_params = {
@@ -180,13 +502,13 @@ class TestTextToSpeechTool(unittest.TestCase):
         result = results[0]
         self.assertIn("API error: 401", result.message.text)
 
-    @patch("requests.post")
+    @patch.object(SESSION, "post")
     def test_empty_response_handling(self, mock_post):
         """Test handling of empty API response"""
         # Mock API response with empty content
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.content = b""
+        mock_response.iter_content.return_value = [b""]
         mock_post.return_value = mock_response
 
         test_params = {
@@ -236,7 +558,15 @@ class TestTextToSpeechTool(unittest.TestCase):
         result = results[0]
         self.assertIn("Parameter error", result.message.text)
 
-    def test_voice_options(self):
+    @staticmethod
+    def _ok_response():
+        """Build a successful synthesis response"""
+        response = MagicMock(status_code=200)
+        response.iter_content.return_value = [b"fake_audio_data"]
+        return response
+
+    @patch.object(SESSION, "post")
+    def test_voice_options(self, mock_post):
         """Test different voice options"""
         voices = [
             "marina",
@@ -248,13 +578,12 @@ class TestTextToSpeechTool(unittest.TestCase):
             "zahar",
             "madi_ru",
         ]
+        ok_response = self._ok_response()
 
         for voice in voices:
-            with patch("requests.post") as mock_post:
-                mock_response = MagicMock()
-                mock_response.status_code = 200
-                mock_response.content = b"fake_audio_data"
-                mock_post.return_value = mock_response
+            with self.subTest(voice=voice):
+                mock_post.reset_mock()
+                mock_post.return_value = ok_response
 
                 test_params = {
                     "text": "Тестовый текст",
@@ -271,16 +600,16 @@ class TestTextToSpeechTool(unittest.TestCase):
                 call_args = mock_post.call_args
                 self.assertEqual(call_args[1]["data"]["voice"], voice)
 
-    def test_emotion_options(self):
+    @patch.object(SESSION, "post")
+    def test_emotion_options(self, mock_post):
         """Test different emotion options"""
         emotions = ["neutral", "good", "evil", "friendly", "whisper"]
+        ok_response = self._ok_response()
 
         for emotion in emotions:
-            with patch("requests.post") as mock_post:
-                mock_response = MagicMock()
-                mock_response.status_code = 200
-                mock_response.content = b"fake_audio_data"
-                mock_post.return_value = mock_response
+            with self.subTest(emotion=emotion):
+                mock_post.reset_mock()
+                mock_post.return_value = ok_response
 
                 test_params = {
                     "text": "Тестовый текст",
@@ -297,16 +626,16 @@ class TestTextToSpeechTool(unittest.TestCase):
                 call_args = mock_post.call_args
                 self.assertEqual(call_args[1]["data"]["emotion"], emotion)
 
-    def test_format_options(self):
+    @patch.object(SESSION, "post")
+    def test_format_options(self, mock_post):
         """Test different format options"""
         formats = ["mp3", "wav", "opus"]
+        ok_response = self._ok_response()
 
         for format_type in formats:
-            with patch("requests.post") as mock_post:
-                mock_response = MagicMock()
-                mock_response.status_code = 200
-                mock_response.content = b"fake_audio_data"
-                mock_post.return_value = mock_response
+            with self.subTest(format=format_type):
+                mock_post.reset_mock()
+                mock_post.return_value = ok_response
 
                 test_params = {
                     "text": "Тестовый текст",
@@ -327,16 +656,16 @@ class TestTextToSpeechTool(unittest.TestCase):
                 blob_result = results[1]
                 self.assertTrue(hasattr(blob_result, "message"))
 
-    def test_speed_options(self):
+    @patch.object(SESSION, "post")
+    def test_speed_options(self, mock_post):
         """Test different speed options"""
         speeds = [0.1, 0.5, 1.0, 2.0, 3.0]
+        ok_response = self._ok_response()
 
         for speed in speeds:
-            with patch("requests.post") as mock_post:
-                mock_response = MagicMock()
-                mock_response.status_code = 200
-                mock_response.content = b"fake_audio_data"
-                mock_post.return_value = mock_response
+            with self.subTest(speed=speed):
+                mock_post.reset_mock()
+                mock_post.return_value = ok_response
 
                 test_params = {
                     "text": "Тестовый текст",
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Synthesized audio is kept on disk between plugin restarts. File mtimes
+# are refreshed on every hit, so they double as the LRU order. Set
+# YANDEX_TTS_DISK_CACHE=0 to keep synthesized audio in memory only
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "dify-yandex-tts")
+_DISABLED_VALUES = frozenset({"0", "false", "no", "off"})
+DISK_ENABLED = os.getenv("YANDEX_TTS_DISK_CACHE", "1").lower() not in _DISABLED_VALUES
+DISK_TTL = 7 * 24 * 3600
+DISK_MAX_BYTES = 256 * 1024 * 1024
+_SWEEP_INTERVAL = 3600
+
+# Hottest results are also served straight from memory
+MEMORY_MAX_ITEMS = 256
+MEMORY_MAX_BYTES = 64 * 1024 * 1024
+_MEMORY_CACHE: "OrderedDict[str, bytes]" = OrderedDict()
+_memory_bytes = 0
+_CACHE_LOCK = threading.Lock()
+_last_sweep = 0.0
+_written_since_sweep = 0
+
+
+def make_key(params: dict[str, str], api_key: str) -> str:
+    """
+    Build a cache key from validated synthesis parameters and the API key,
+    so audio is only ever served back to the key that paid for it
+    """
+    payload = json.dumps(
+        {
+            "k": hashlib.sha256(api_key.encode()).hexdigest(),
+            "t": params["text"],
+            "v": params["voice"],
+            "e": params["emotion"],
+            "s": params["speed"],
+            "f": params["format"],
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _disk_path(key: str, ext: str) -> str:
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.{ext}")
+
+
+def get(key: str, ext: str) -> Optional[bytes]:
+    """
+    Return cached audio for the key, checking memory first and then disk
+    """
+    with _CACHE_LOCK:
+        audio = _MEMORY_CACHE.get(key)
+        if audio is not None:
+            _MEMORY_CACHE.move_to_end(key)
+            return audio
+
+    if not DISK_ENABLED:
+        return None
+
+    path = _disk_path(key, ext)
+    try:
+        if time.time() - os.path.getmtime(path) > DISK_TTL:
+            os.remove(path)
+            return None
+        with open(path, "rb") as f:
+            audio = f.read()
+        os.utime(path)
+    except OSError:
+        return None
+
+    _remember(key, audio)
+    return audio
+
+
+def put(key: str, ext: str, audio: bytes) -> None:
+    """
+    Store audio in both cache tiers
+    """
+    _remember(key, audio)
+
+    if not DISK_ENABLED:
+        return
+
+    path = _disk_path(key, ext)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary name first so readers never see partial files
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(audio)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Failed to write TTS cache file: {e}")
+        return
+
+    _maybe_sweep(len(audio))
+
+
+def clear() -> None:
+    """
+    Forget all audio cached in memory
+    """
+    global _memory_bytes
+    with _CACHE_LOCK:
+        _MEMORY_CACHE.clear()
+        _memory_bytes = 0
+
+
+def _remember(key: str, audio: bytes) -> None:
+    global _memory_bytes
+    # Audio larger than the whole budget would only evict everything else
+    if len(audio) > MEMORY_MAX_BYTES:
+        return
+    with _CACHE_LOCK:
+        previous = _MEMORY_CACHE.pop(key, None)
+        if previous is not None:
+            _memory_bytes -= len(previous)
+        _MEMORY_CACHE[key] = audio
+        _memory_bytes += len(audio)
+        while len(_MEMORY_CACHE) > MEMORY_MAX_ITEMS or _memory_bytes > MEMORY_MAX_BYTES:
+            _, evicted = _MEMORY_CACHE.popitem(last=False)
+            _memory_bytes -= len(evicted)
+
+
+def _maybe_sweep(written: int = 0) -> None:
+    """
+    Remove expired disk entries and trim the cache to DISK_MAX_BYTES,
+    at most once per sweep interval unless a lot has been written since
+    """
+    global _last_sweep, _written_since_sweep
+    now = time.time()
+    with _CACHE_LOCK:
+        _written_since_sweep += written
+        if (
+            now - _last_sweep < _SWEEP_INTERVAL
+            and _written_since_sweep < DISK_MAX_BYTES // 8
+        ):
+            return
+        _last_sweep = now
+        _written_since_sweep = 0
+
+    entries = []
+    total = 0
+    try:
+        for root, _, files in os.walk(CACHE_DIR):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                    if now - stat.st_mtime > DISK_TTL:
+                        os.remove(path)
+                        continue
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+    except OSError as e:
+        logger.warning(f"Failed to sweep TTS cache: {e}")
+        return
+
+    # Evict least recently used files until the cache fits its budget
+    if total > DISK_MAX_BYTES:
+        entries.sort()
+        for _, size, path in entries:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= DISK_MAX_BYTES:
+                break
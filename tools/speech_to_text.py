@@ -1,136 +1,160 @@
 import logging
+import struct
 from io import BytesIO
-from typing import Any, Generator
+from types import MappingProxyType
+from typing import Any, Generator, Optional
 
-import requests
+import numpy as np
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 
+from provider._http import SESSION, json_loads
+
+try:
+    from pydub import AudioSegment
+    from pydub.utils import which
+
+    _HAS_FFMPEG = which("ffmpeg") is not None
+except ImportError:
+    AudioSegment = None
+    _HAS_FFMPEG = False
+
 logger = logging.getLogger(__name__)
 
+_STT_URL = "https://stt.api.cloud.yandex.net/speech/v1/stt:recognize"
+
+# Request parameters shared by every recognition call
+_BASE_PARAMS = MappingProxyType({"format": "lpcm"})
+
+# (connect, read) timeouts: fail fast on unreachable hosts, allow slow responses
+REQUEST_TIMEOUT = (3.05, 30)
+
+# Sample rates accepted by the v1 recognize API for LPCM input
+LPCM_SAMPLE_RATES = frozenset({8000, 16000, 48000})
+
+# Synchronous v1 recognition accepts at most 1 MB and 30 seconds of audio
+MAX_AUDIO_BYTES = 1 << 20
+MAX_AUDIO_SECONDS = 30
+
+_BYTES_TYPES = (bytes, bytearray, memoryview)
+
+
+def _extract_via_download(audio_file: Any) -> Any:
+    # Prefer explicit download() to avoid lazy URL fetch inside .blob
+    download = getattr(audio_file, "download", None)
+    if not callable(download):
+        return None
+    content = download()
+    if isinstance(content, _BYTES_TYPES):
+        return content
+    # Some SDKs may return an object with 'content' attribute
+    return getattr(content, "content", None)
+
+
+def _extract_via_blob(audio_file: Any) -> Any:
+    blob = getattr(audio_file, "blob", None)
+    return blob if isinstance(blob, _BYTES_TYPES) else None
+
+
+def _extract_via_read(audio_file: Any) -> Any:
+    read = getattr(audio_file, "read", None)
+    return read() if callable(read) else None
+
+
+# Attribute-based readers tried in order on file objects
+_EXTRACTORS = (
+    _extract_via_download,
+    _extract_via_blob,
+    _extract_via_read,
+    lambda audio_file: getattr(audio_file, "content", None),
+    lambda audio_file: getattr(audio_file, "data", None),
+)
+
+
+def _parse_wav_inplace(buf: bytes) -> Optional[dict[str, Any]]:
+    """
+    Read the RIFF header of an in-memory WAV and return its format along
+    with a zero-copy view of the PCM payload. Returns None if the data is
+    not a well-formed WAV with a fmt chunk before the data chunk.
+    """
+    if len(buf) < 12:
+        return None
+    riff, _, wave_id = struct.unpack_from("<4sI4s", buf, 0)
+    if riff != b"RIFF" or wave_id != b"WAVE":
+        return None
+
+    fmt = None
+    offset = 12
+    try:
+        while offset + 8 <= len(buf):
+            chunk_id, chunk_size = struct.unpack_from("<4sI", buf, offset)
+            body = offset + 8
+            if chunk_id == b"fmt " and chunk_size >= 16:
+                fmt = struct.unpack_from("<HHIIHH", buf, body)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    return None
+                format_tag, channels, rate, _, _, bits = fmt
+                width = bits // 8
+                if not channels or not width:
+                    return None
+                # Drop a trailing partial frame, e.g. from a truncated upload
+                data_len = min(chunk_size, len(buf) - body)
+                data_len -= data_len % (channels * width)
+                return {
+                    "format_tag": format_tag,
+                    "rate": rate,
+                    "width": width,
+                    "channels": channels,
+                    "pcm": memoryview(buf)[body : body + data_len],
+                }
+            # Chunks are padded to an even size
+            offset = body + chunk_size + (chunk_size & 1)
+    except struct.error:
+        return None
+
+    return None
+
 
 class SpeechToTextTool(Tool):
     """
     Yandex SpeechKit Speech-to-Text tool with support for multiple audio formats including WEBM
     """
 
-    SUPPORTED_EXTENSIONS = [
-        ".mp3",
-        ".wav",
-        ".flac",
-        ".ogg",
-        ".opus",
-        ".m4a",
-        ".webm",
-        ".aac",
-        ".wma",
-    ]
+    SUPPORTED_EXTENSIONS = frozenset(
+        {
+            ".mp3",
+            ".wav",
+            ".flac",
+            ".ogg",
+            ".opus",
+            ".m4a",
+            ".webm",
+            ".aac",
+            ".wma",
+        }
+    )
 
     def _get_audio_data_from_file(self, audio_file: Any) -> bytes:
         """
         Extract audio data from various file formats (Dify file object, file-like object, or bytes)
         """
         try:
-            logger.info(f"Processing audio file of type: {type(audio_file)}")
-
-            # Case 1: Dify File object (dify_plugin.file.file.File)
-            # Prefer explicit download() to avoid lazy URL fetch inside .blob
-            if hasattr(audio_file, "download") or hasattr(audio_file, "blob"):
-                logger.info("Processing Dify File object via download/blob")
-                # Prefer download()
-                if hasattr(audio_file, "download"):
-                    content = audio_file.download()
-                    if isinstance(content, (bytes, bytearray, memoryview)):
-                        return bytes(content)
-                    # Some SDKs may return an object with 'content' attribute
-                    if hasattr(content, "content"):
-                        return content.content
-                # Fallback: blob/read/content/data
-                if hasattr(audio_file, "blob"):
-                    content = audio_file.blob
-                    if isinstance(content, (bytes, bytearray, memoryview)):
-                        return bytes(content)
-                if hasattr(audio_file, "read"):
-                    return audio_file.read()
-                if hasattr(audio_file, "content"):
-                    return audio_file.content
-                if hasattr(audio_file, "data"):
-                    return audio_file.data
-
-                # Fallback 2: try SDK attributes or absolute URL without requiring env vars
-                # 2a) Try absolute remote_url if provided
-                remote_url = None
-                for attr_name in ("remote_url", "url"):
-                    if hasattr(audio_file, attr_name):
-                        remote_url = getattr(audio_file, attr_name)
-                        break
-                    if isinstance(getattr(audio_file, "__dict__", {}), dict):
-                        remote_url = audio_file.__dict__.get(attr_name) or remote_url
-
-                if isinstance(remote_url, str) and remote_url.lower().startswith(
-                    ("http://", "https://")
-                ):
-                    try:
-                        logger.info(f"Fetching file via absolute URL: {remote_url}")
-                        resp = requests.get(remote_url, timeout=30)
-                        resp.raise_for_status()
-                        return resp.content
-                    except Exception as url_err:
-                        logger.warning(f"Failed to fetch via absolute URL: {url_err}")
-
-                # 2b) Try ID-based retrieval if available on runtime/session (SDK-dependent)
-                try:
-                    file_id = None
-                    for attr_name in ("id", "related_id"):
-                        if hasattr(audio_file, attr_name):
-                            file_id = getattr(audio_file, attr_name)
-                            if file_id:
-                                break
-                        if (
-                            isinstance(getattr(audio_file, "__dict__", {}), dict)
-                            and not file_id
-                        ):
-                            file_id = audio_file.__dict__.get(attr_name) or file_id
-
-                    if file_id:
-                        if hasattr(self, "get_file_content"):
-                            return self.get_file_content(file_id)
-                        if hasattr(self.runtime, "get_file_content"):
-                            return self.runtime.get_file_content(file_id)
-                        if hasattr(self.runtime, "get_file"):
-                            return self.runtime.get_file(file_id)
-                except Exception as id_err:
-                    logger.warning(f"Failed to fetch via SDK by id: {id_err}")
+            logger.debug("Processing audio file of type: %s", type(audio_file))
 
-                # Nothing else worked
-                raise ValueError(
-                    "Could not read Dify File object: no blob/download/read/data/content available, "
-                    "no absolute URL, and SDK file fetch by id not supported in this runtime."
-                )
-
-            # Case 2: File-like object (has read method)
-            elif hasattr(audio_file, "read"):
-                logger.info("Processing file-like object with read() method")
-                content = audio_file.read()
-                logger.info(
-                    f"Successfully read file content, size: {len(content)} bytes"
-                )
-                return content
-
-            # Case 3: Already bytes
-            elif isinstance(audio_file, bytes):
-                logger.info("Processing raw bytes data")
+            # Raw bytes, file paths and metadata dicts are dispatched by type
+            if isinstance(audio_file, bytes):
+                logger.debug("Processing raw bytes data")
                 return audio_file
 
-            # Case 4: String path to file
-            elif isinstance(audio_file, str):
-                logger.info(f"Processing file path: {audio_file}")
+            if isinstance(audio_file, str):
+                logger.debug("Processing file path: %s", audio_file)
                 with open(audio_file, "rb") as f:
                     return f.read()
 
-            # Case 5: Dictionary with file metadata (Dify passes this in some contexts)
-            elif isinstance(audio_file, dict):
-                logger.info(f"Processing file metadata dict: {audio_file}")
+            # Dictionary with file metadata (Dify passes this in some contexts)
+            if isinstance(audio_file, dict):
+                logger.debug("Processing file metadata dict: %s", audio_file)
                 # Prefer fetching by file id via SDK/session if available
                 related_id = audio_file.get("related_id") or audio_file.get("id")
                 if related_id:
@@ -172,17 +196,11 @@ class SpeechToTextTool(Tool):
                             logger.debug(f"SDK fetch attempt failed: {sdk_err}")
 
                 # As a last resort, only accept absolute URLs
-                remote_url = audio_file.get("remote_url") or audio_file.get("url")
-                if isinstance(remote_url, str) and remote_url.lower().startswith(
-                    ("http://", "https://")
-                ):
-                    try:
-                        logger.info(f"Fetching file via absolute URL: {remote_url}")
-                        resp = requests.get(remote_url, timeout=30)
-                        resp.raise_for_status()
-                        return resp.content
-                    except Exception as url_err:
-                        logger.debug(f"Absolute URL fetch failed: {url_err}")
+                content = self._fetch_absolute_url(
+                    audio_file.get("remote_url") or audio_file.get("url")
+                )
+                if content is not None:
+                    return content
 
                 # If we reach here, we could not retrieve bytes safely
                 raise ValueError(
@@ -190,104 +208,206 @@ class SpeechToTextTool(Tool):
                     "and no absolute URL available)."
                 )
 
-            else:
-                # List available attributes for debugging
-                if hasattr(audio_file, "__dict__") or hasattr(audio_file, "__class__"):
-                    attrs = [
-                        attr for attr in dir(audio_file) if not attr.startswith("_")
-                    ]
-                    logger.info(f"Available attributes: {attrs}")
+            # File objects (Dify File, file-like): the first reader with data wins
+            for extract in _EXTRACTORS:
+                content = extract(audio_file)
+                if content is not None:
+                    if isinstance(content, (bytearray, memoryview)):
+                        return bytes(content)
+                    return content
+
+            # Fallback: absolute URL, then SDK fetch by id (SDK-dependent)
+            content = self._fetch_absolute_url(
+                getattr(audio_file, "remote_url", None)
+                or getattr(audio_file, "url", None)
+            )
+            if content is not None:
+                return content
+
+            file_id = getattr(audio_file, "id", None) or getattr(
+                audio_file, "related_id", None
+            )
+            if file_id:
+                try:
+                    for accessor in (
+                        getattr(self, "get_file_content", None),
+                        getattr(self.runtime, "get_file_content", None),
+                        getattr(self.runtime, "get_file", None),
+                    ):
+                        if callable(accessor):
+                            return accessor(file_id)
+                except Exception as id_err:
+                    logger.warning(f"Failed to fetch via SDK by id: {id_err}")
 
+            if hasattr(audio_file, "download") or hasattr(audio_file, "blob"):
                 raise ValueError(
-                    f"Unsupported audio file type: {type(audio_file)}. "
-                    f"Expected Dify File object with .blob property."
+                    "Could not read Dify File object: no blob/download/read/data/content available, "
+                    "no absolute URL, and SDK file fetch by id not supported in this runtime."
                 )
 
+            # List available attributes for debugging
+            if logger.isEnabledFor(logging.DEBUG):
+                attrs = [attr for attr in dir(audio_file) if not attr.startswith("_")]
+                logger.debug("Available attributes: %s", attrs)
+
+            raise ValueError(
+                f"Unsupported audio file type: {type(audio_file)}. "
+                f"Expected Dify File object with .blob property."
+            )
+
         except Exception as e:
             logger.error(f"Error extracting audio data: {str(e)}")
             raise
 
-    def _convert_audio_to_wav(
-        self, audio_data: bytes, source_format: str = None
-    ) -> bytes:
+    def _fetch_absolute_url(self, remote_url: Any) -> Optional[bytes]:
         """
-        Convert audio data to WAV format using pydub
+        Download file bytes from an absolute http(s) URL, if one is given
         """
+        if not (
+            isinstance(remote_url, str)
+            and remote_url.lower().startswith(("http://", "https://"))
+        ):
+            return None
+
         try:
-            from pydub import AudioSegment
-            from pydub.utils import which
+            logger.debug("Fetching file via absolute URL: %s", remote_url)
+            resp = SESSION.get(remote_url, timeout=REQUEST_TIMEOUT)
+            resp.raise_for_status()
+            return resp.content
+        except Exception as url_err:
+            logger.warning(f"Failed to fetch via absolute URL: {url_err}")
+            return None
+
+    def _decode_to_pcm(self, audio_data: bytes) -> tuple[bytes, int]:
+        """
+        Decode any supported audio format to 16-bit mono 16kHz PCM using pydub
+        """
+        if AudioSegment is None:
+            logger.error(
+                "pydub library is not installed. Please install it: pip install pydub"
+            )
+            raise ValueError("Audio conversion library not available")
 
-            # Check if ffmpeg is available
-            if not which("ffmpeg"):
-                logger.warning("FFmpeg not found, attempting conversion without it")
+        if not _HAS_FFMPEG:
+            logger.warning("FFmpeg not found, attempting conversion without it")
 
+        try:
             # Load audio from bytes
             audio = AudioSegment.from_file(BytesIO(audio_data))
 
-            # Convert to mono 16kHz WAV (required by Yandex)
-            audio = audio.set_channels(1)  # Mono
-            audio = audio.set_frame_rate(16000)  # 16kHz
-            audio = audio.set_sample_width(2)  # 16-bit
+            # Convert to mono 16kHz 16-bit (required by Yandex)
+            audio = audio.set_channels(1).set_frame_rate(16000).set_sample_width(2)
 
-            # Export to WAV bytes
-            wav_buffer = BytesIO()
-            audio.export(wav_buffer, format="wav")
-            return wav_buffer.getvalue()
+            return audio.raw_data, audio.frame_rate
 
-        except ImportError:
-            logger.error(
-                "pydub library is not installed. Please install it: pip install pydub"
-            )
-            raise ValueError("Audio conversion library not available")
         except Exception as e:
             logger.error(f"Audio conversion failed: {str(e)}")
             raise ValueError(f"Failed to convert audio: {str(e)}")
 
+    def _resample_pcm(self, pcm_data: bytes, sample_rate: int) -> tuple[bytes, int]:
+        """
+        Resample 16-bit mono PCM to 16kHz using pydub
+        """
+        if AudioSegment is None:
+            raise ValueError("Audio conversion library not available")
+
+        audio = AudioSegment(
+            data=pcm_data, sample_width=2, frame_rate=sample_rate, channels=1
+        ).set_frame_rate(16000)
+        return audio.raw_data, audio.frame_rate
+
+    def _fast_wav_parse(self, audio_data: bytes) -> Optional[tuple[bytes, int]]:
+        """
+        Extract PCM from a WAV that already is 16-bit mono LPCM at a rate
+        Yandex accepts. Returns None for anything that needs conversion.
+        """
+        info = _parse_wav_inplace(audio_data)
+        if (
+            info is None
+            or info["format_tag"] != 1
+            or info["channels"] != 1
+            or info["width"] != 2
+            or info["rate"] not in LPCM_SAMPLE_RATES
+        ):
+            return None
+        return bytes(info["pcm"]), info["rate"]
+
+    def _normalize_gain(self, raw: bytes | memoryview) -> bytes:
+        """
+        Apply gain normalization to quiet 16-bit PCM recordings
+        """
+        samples = np.frombuffer(raw, dtype="<i2")
+        if not samples.size:
+            return bytes(raw)
+
+        # The peak bounds the gain so scaled samples always fit in 16 bits;
+        # min/max avoid np.abs, which overflows on -32768
+        peak = max(int(samples.max()), -int(samples.min()))
+        gain = 1
+        if 0 < peak < 8192:
+            gain = 4
+        elif 0 < peak < 16384:
+            gain = 2
+        if gain != 1:
+            raw = (samples * np.int16(gain)).astype("<i2").tobytes()
+            logger.debug("Applied gain x%d, previous peak=%d", gain, peak)
+
+        # bytes() is a no-op for bytes and copies a memoryview only here
+        return bytes(raw)
+
     def _convert_wav_to_pcm(self, wav_data: bytes) -> tuple[bytes, int]:
         """
         Convert WAV data to raw PCM and extract sample rate
         """
         try:
-            import audioop
-            import wave
-
-            with wave.open(BytesIO(wav_data), "rb") as wav_reader:
-                src_rate = wav_reader.getframerate()
-                sample_width = wav_reader.getsampwidth()
-                channels = wav_reader.getnchannels()
-                frames = wav_reader.getnframes()
-
-                if sample_width != 2:
-                    raise ValueError(
-                        f"Unsupported WAV sample width: {sample_width * 8} bits. Only 16-bit PCM supported"
-                    )
+            info = _parse_wav_inplace(wav_data)
+            if info is not None and info["format_tag"] == 1:
+                src_rate = info["rate"]
+                sample_width = info["width"]
+                channels = info["channels"]
+                raw = info["pcm"]
+            else:
+                # Unusual headers are left to the standard library parser
+                src_rate, sample_width, channels, raw = self._read_wav_fallback(
+                    wav_data
+                )
 
-                raw = wav_reader.readframes(frames)
+            if sample_width != 2:
+                raise ValueError(
+                    f"Unsupported WAV sample width: {sample_width * 8} bits. Only 16-bit PCM supported"
+                )
 
-                # Convert to mono if needed
-                if channels > 1:
-                    raw = audioop.tomono(raw, sample_width, 0.5, 0.5)
+            # Convert to mono if needed
+            if channels > 1:
+                samples = np.frombuffer(raw, dtype="<i2").reshape(-1, channels)
+                raw = (
+                    (samples.sum(axis=1, dtype=np.int32) // channels)
+                    .astype("<i2")
+                    .tobytes()
+                )
 
-                # Apply gain normalization for quiet recordings
-                try:
-                    rms = audioop.rms(raw, sample_width)
-                    gain = 1.0
-                    if rms and rms < 300:
-                        gain = 4.0
-                    elif rms and rms < 1000:
-                        gain = 2.0
-                    if gain != 1.0:
-                        raw = audioop.mul(raw, sample_width, gain)
-                        logger.info(f"Applied gain x{gain}, previous RMS={rms}")
-                except Exception:
-                    pass
+            raw = self._normalize_gain(raw)
 
-                return raw, src_rate
+            return raw, src_rate
 
         except Exception as e:
             logger.error(f"WAV to PCM conversion failed: {str(e)}")
             raise ValueError(f"Failed to process WAV file: {str(e)}")
 
+    def _read_wav_fallback(self, wav_data: bytes) -> tuple[int, int, int, bytes]:
+        """
+        Read WAV format and frames using the wave module
+        """
+        import wave
+
+        with wave.open(BytesIO(wav_data), "rb") as wav_reader:
+            return (
+                wav_reader.getframerate(),
+                wav_reader.getsampwidth(),
+                wav_reader.getnchannels(),
+                wav_reader.readframes(wav_reader.getnframes()),
+            )
+
     def _invoke(
         self, tool_parameters: dict[str, Any]
     ) -> Generator[ToolInvokeMessage, None, None]:
@@ -317,47 +437,81 @@ class SpeechToTextTool(Tool):
                 logger.error(f"Failed to read audio file: {str(e)}")
                 raise Exception(f"Failed to read audio file - {str(e)}")
 
-            logger.info(f"Processing audio file, size: {len(audio_data)} bytes")
+            logger.debug("Processing audio file, size: %d bytes", len(audio_data))
 
-            # Check if conversion is needed
-            # For efficiency, we'll try to detect if it's already a WAV file
-            try:
-                # Try to process as WAV directly
-                pcm_data, sample_rate = self._convert_wav_to_pcm(audio_data)
-                logger.info("Audio processed as WAV directly")
-            except:
-                # If that fails, convert from other format first
-                logger.info("Converting audio to WAV format")
-                wav_data = self._convert_audio_to_wav(audio_data)
-                pcm_data, sample_rate = self._convert_wav_to_pcm(wav_data)
-                logger.info("Audio converted and processed successfully")
+            # Fast path: WAV that already is 16-bit mono LPCM needs no decoding
+            fast_pcm = self._fast_wav_parse(audio_data)
+            if fast_pcm is not None:
+                pcm_data, sample_rate = fast_pcm
+                pcm_data = self._normalize_gain(pcm_data)
+                logger.debug("Audio is LPCM-compatible WAV, skipping conversion")
+            else:
+                try:
+                    # Try to process as WAV directly
+                    pcm_data, sample_rate = self._convert_wav_to_pcm(audio_data)
+                    logger.debug("Audio processed as WAV directly")
+                except ValueError:
+                    # If that fails, decode from other format first
+                    logger.debug("Decoding audio to PCM")
+                    pcm_data, sample_rate = self._decode_to_pcm(audio_data)
+                    pcm_data = self._normalize_gain(pcm_data)
+                    logger.debug("Audio decoded and processed successfully")
+
+            # Reject audio the API would refuse before uploading it
+            duration = len(pcm_data) / (2 * sample_rate)
+            if duration > MAX_AUDIO_SECONDS:
+                raise Exception(
+                    f"Audio is too long ({duration:.1f} s): "
+                    f"recognition accepts up to {MAX_AUDIO_SECONDS} s"
+                )
+
+            # 30 s of 16kHz PCM fits in the size limit, so high-rate audio
+            # over it is downsampled rather than rejected
+            if len(pcm_data) > MAX_AUDIO_BYTES and sample_rate > 16000:
+                try:
+                    pcm_data, sample_rate = self._resample_pcm(pcm_data, sample_rate)
+                    logger.debug("Audio resampled to 16kHz to fit the size limit")
+                except ValueError as e:
+                    logger.warning(f"Could not resample audio: {str(e)}")
+
+            if len(pcm_data) > MAX_AUDIO_BYTES:
+                raise Exception(
+                    f"Audio is too large ({len(pcm_data)} bytes of PCM at "
+                    f"{sample_rate} Hz): recognition accepts up to "
+                    f"{MAX_AUDIO_BYTES} bytes"
+                )
 
             # Prepare API request
-            url = "https://stt.api.cloud.yandex.net/speech/v1/stt:recognize"
             headers = {"Authorization": f"Api-Key {api_key}"}
             params = {
+                **_BASE_PARAMS,
                 "lang": language,
-                "format": "lpcm",
                 "topic": topic,
                 "sampleRateHertz": str(sample_rate),
             }
 
-            logger.info(f"Making API request with params: {params}")
+            logger.debug("Making API request with params: %s", params)
 
             # Send request to Yandex SpeechKit
-            response = requests.post(
-                url, headers=headers, params=params, data=pcm_data, timeout=30
+            response = SESSION.post(
+                _STT_URL,
+                headers=headers,
+                params=params,
+                data=pcm_data,
+                timeout=REQUEST_TIMEOUT,
             )
 
-            logger.info(f"API response status: {response.status_code}")
+            logger.debug("API response status: %s", response.status_code)
 
             if response.status_code != 200:
                 error_msg = f"API error: {response.status_code}"
+                # Read the body once; it may not be JSON at all
+                body = response.content or b""
                 try:
-                    error_data = response.json()
+                    error_data = json_loads(body)
                     error_msg += f" - {error_data.get('error', {}).get('message', 'Unknown error')}"
-                except:
-                    error_msg += f" - {response.text}"
+                except Exception:
+                    error_msg += f" - {body[:512].decode('utf-8', 'replace')}"
 
                 logger.error(error_msg)
                 raise Exception(error_msg)
@@ -369,7 +523,7 @@ class SpeechToTextTool(Tool):
             if not recognized_text:
                 raise Exception("No speech detected in the audio file")
 
-            logger.info(f"Recognition successful: {recognized_text[:100]}...")
+            logger.debug("Recognition successful: %.100s...", recognized_text)
             yield self.create_text_message(recognized_text)
 
         except Exception as e:
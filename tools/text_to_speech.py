@@ -1,12 +1,80 @@
+import asyncio
+import functools
 import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
 from typing import Any, Generator
 
 import requests
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
+from urllib3.exceptions import ReadTimeoutError
+
+from provider._http import SESSION, json_loads
+from tools import _tts_cache as tts_cache
 
 logger = logging.getLogger(__name__)
 
+_TTS_URL = "https://tts.api.cloud.yandex.net/speech/v1/tts:synthesize"
+
+# (connect, read) timeouts: fail fast on unreachable hosts, allow slow synthesis
+REQUEST_TIMEOUT = (3.05, 30)
+
+# MP3 texts longer than this are split at sentence boundaries and synthesized in parallel
+PARALLEL_CHUNK_CHARS = 500
+PARALLEL_MAX_WORKERS = 4
+
+# Upper bound on concurrent API calls for batch synthesis
+BATCH_MAX_CONCURRENCY = 8
+
+# Read size for streamed synthesis responses
+STREAM_CHUNK_SIZE = 65536
+
+# Sentence ends and line breaks, e.g. between verses or list items
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?…])\s+|\s*\n\s*")
+
+# Validated parameters for calls that leave every option at its default
+_DEFAULT_PARAMS = MappingProxyType(
+    {"voice": "marina", "emotion": "neutral", "speed": "1.0", "format": "mp3"}
+)
+
+# One bit per emotion, so per-voice support is checked with a single AND
+_EMOTION_BITS = {"neutral": 1, "good": 2, "evil": 4, "friendly": 8, "whisper": 16}
+
+# Matches only the leading whitespace, so the text is never copied
+_SSML_START_RE = re.compile(r"\s*<speak")
+
+
+class SynthesisAPIError(Exception):
+    """
+    Error response from the TTS API, carrying its HTTP status
+    """
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _is_default_params(tool_parameters: dict[str, Any]) -> bool:
+    """
+    Check whether the call uses the default voice, emotion, speed and format
+    """
+    get = tool_parameters.get
+    return (
+        get("voice", "marina") == "marina"
+        and get("emotion", "neutral") == "neutral"
+        and get("format", "mp3") == "mp3"
+        and get("speed", 1.0) in (1, "1", "1.0")
+    )
+
+
+def _is_ssml(text: str) -> bool:
+    """
+    Check whether the text is an SSML document
+    """
+    return _SSML_START_RE.match(text) is not None
+
 
 class TextToSpeechTool(Tool):
     """
@@ -25,6 +93,8 @@ class TextToSpeechTool(Tool):
         "madi_ru": "Мади - мужской голос (рус.)",
     }
 
+    VOICES = frozenset(VOICE_DESCRIPTIONS)
+
     # Allowed emotions per voice (API v1 capabilities)
     VOICE_ALLOWED_EMOTIONS = {
         "marina": {"neutral", "whisper", "friendly"},
@@ -37,67 +107,329 @@ class TextToSpeechTool(Tool):
         "madi_ru": {"neutral"},
     }
 
-    FORMAT_MIME = {
-        "mp3": "audio/mpeg",
-        "oggopus": "audio/ogg",
+    VOICE_EMOTION_MASK = {
+        voice: sum(_EMOTION_BITS[emotion] for emotion in allowed)
+        for voice, allowed in VOICE_ALLOWED_EMOTIONS.items()
     }
 
-    def _validate_parameters(self, tool_parameters: dict[str, Any]) -> dict[str, str]:
-        """
-        Validate and process tool parameters
-        """
-        errors = []
+    EMOTIONS = frozenset(_EMOTION_BITS)
 
-        text = tool_parameters.get("text", "").strip()
-        if not text:
-            errors.append("Text content is required")
-        elif len(text) > 5000:
-            errors.append("Text is too long (maximum 5000 characters)")
+    # API v1 output formats
+    FORMATS = frozenset({"mp3", "oggopus"})
 
-        voice = tool_parameters.get("voice", "marina")
-        if voice not in self.VOICE_DESCRIPTIONS:
-            errors.append(f"Invalid voice: {voice}")
+    # API format -> (MIME type, file extension, format name shown to users)
+    FORMAT_INFO = {
+        "mp3": ("audio/mpeg", "mp3", "mp3"),
+        "oggopus": ("audio/ogg", "ogg", "opus"),
+    }
 
-        emotion = tool_parameters.get("emotion", "neutral")
-        if emotion not in ["neutral", "good", "evil", "friendly", "whisper"]:
-            errors.append(f"Invalid emotion: {emotion}")
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def _validate_core(
+        text_len: int, voice: str, emotion: str, speed: Any, format_type: str
+    ) -> tuple[str, str, str, str]:
+        """
+        Validate everything except the text itself; results are memoized
+        """
+        cls = TextToSpeechTool
+
+        # Checks run cheapest first and stop at the first failure
+        if not text_len:
+            raise ValueError("Text content is required")
+        if text_len > 5000:
+            raise ValueError("Text is too long (maximum 5000 characters)")
+
+        if voice not in cls.VOICES:
+            raise ValueError(f"Invalid voice: {voice}")
+
+        if not cls.VOICE_EMOTION_MASK[voice] & _EMOTION_BITS.get(emotion, 0):
+            if emotion not in cls.EMOTIONS:
+                raise ValueError(f"Invalid emotion: {emotion}")
+            allowed_list = ", ".join(sorted(cls.VOICE_ALLOWED_EMOTIONS[voice]))
+            raise ValueError(
+                f"Emotion '{emotion}' is not supported by voice '{voice}'. Allowed: {allowed_list}"
+            )
 
         try:
-            speed = float(tool_parameters.get("speed", 1.0))
-            if not (0.1 <= speed <= 3.0):
-                errors.append("Speed must be between 0.1 and 3.0")
+            speed = float(speed)
         except (ValueError, TypeError):
-            errors.append("Speed must be a valid number")
+            raise ValueError("Speed must be a valid number")
+        if not (0.1 <= speed <= 3.0):
+            raise ValueError("Speed must be between 0.1 and 3.0")
 
-        format_type = tool_parameters.get("format", "mp3")
         # API v1 expects 'oggopus' for Opus output
         if format_type == "opus":
             format_type = "oggopus"
-        if format_type not in ["mp3", "oggopus"]:
-            errors.append(f"Invalid format: {format_type}")
+        if format_type not in cls.FORMATS:
+            raise ValueError(f"Invalid format: {format_type}")
 
-        if errors:
-            raise ValueError("; ".join(errors))
+        return voice, emotion, str(speed), format_type
 
-        # Validate emotion support for selected voice
-        allowed = self.VOICE_ALLOWED_EMOTIONS.get(voice, {"neutral"})
-        if emotion not in allowed:
-            allowed_list = ", ".join(sorted(allowed))
-            errors.append(
-                f"Emotion '{emotion}' is not supported by voice '{voice}'. Allowed: {allowed_list}"
-            )
+    def _validate_parameters(self, tool_parameters: dict[str, Any]) -> dict[str, str]:
+        """
+        Validate and process tool parameters
+        """
+        text = tool_parameters.get("text", "").strip()
 
-        if errors:
-            raise ValueError("; ".join(errors))
+        # Most calls keep the defaults, which need only the text length check
+        if 0 < len(text) <= 5000 and _is_default_params(tool_parameters):
+            return {"text": text, **_DEFAULT_PARAMS}
+
+        # Numbers and strings are hashable as-is; anything else is keyed by its text
+        speed = tool_parameters.get("speed", 1.0)
+        if not isinstance(speed, (int, float, str)):
+            speed = str(speed)
+
+        # Low latency favours the smaller, progressively decodable MP3 output
+        if tool_parameters.get("low_latency"):
+            format_type = "mp3"
+        else:
+            format_type = str(tool_parameters.get("format", "mp3"))
+
+        voice, emotion, speed, format_type = self._validate_core(
+            len(text),
+            str(tool_parameters.get("voice", "marina")),
+            str(tool_parameters.get("emotion", "neutral")),
+            speed,
+            format_type,
+        )
 
         return {
             "text": text,
             "voice": voice,
             "emotion": emotion,
-            "speed": str(speed),
+            "speed": speed,
             "format": format_type,
         }
 
+    def _request_synthesis(
+        self, api_key: str, params: dict[str, str]
+    ) -> requests.Response:
+        """
+        Send a synthesis request and return the response with an unread body
+        """
+        # Prepare API request
+        headers = {"Authorization": f"Api-Key {api_key}"}
+
+        # Prepare request data
+        data = {
+            # SSML support for v1: if text looks like SSML, use 'ssml' param
+            ("ssml" if _is_ssml(params["text"]) else "text"): params["text"],
+            "voice": params["voice"],
+            "speed": params["speed"],
+            "format": params["format"],
+            "lang": "ru-RU",
+        }
+        # Add emotion only if not neutral or explicitly supported
+        if params["emotion"] != "neutral":
+            data["emotion"] = params["emotion"]
+
+        # Make API request; the body is streamed so download overlaps encoding
+        response = SESSION.post(
+            _TTS_URL,
+            headers=headers,
+            data=data,
+            timeout=REQUEST_TIMEOUT,
+            stream=True,
+        )
+
+        logger.info("API response status: %s", response.status_code)
+
+        if response.status_code != 200:
+            error_msg = f"API error: {response.status_code}"
+            # Read the body once; it may not be JSON at all
+            body = response.content or b""
+            try:
+                error_data = json_loads(body)
+                # Normalize different shapes
+                nested = (
+                    error_data.get("error") if isinstance(error_data, dict) else None
+                )
+                if isinstance(nested, dict):
+                    code = nested.get("code") or nested.get("error_code")
+                    msg = nested.get("message") or nested.get("error_message")
+                else:
+                    code = error_data.get("error_code") or error_data.get("code")
+                    msg = error_data.get("message") or error_data.get("error_message")
+                # Fallback to details if present
+                if not msg:
+                    details = error_data.get("details")
+                    if isinstance(details, (list, dict)):
+                        msg = str(details)[:200]
+                if code:
+                    error_msg += f" [{code}]"
+                if msg:
+                    error_msg += f" - {msg}"
+            except Exception:
+                error_msg += f" - {body[:200].decode('utf-8', 'replace')}"
+
+            # Append params context to help debugging
+            error_msg += (
+                f" | voice={params['voice']}, emotion={params['emotion']}, "
+                f"speed={params['speed']}, format={params['format']}"
+            )
+
+            logger.error(error_msg)
+            raise SynthesisAPIError(error_msg, response.status_code)
+
+        return response
+
+    def _synthesize(self, api_key: str, params: dict[str, str]) -> bytes:
+        """
+        Request speech synthesis from the Yandex TTS API
+        """
+        response = self._request_synthesis(api_key, params)
+
+        # Size the buffer from Content-Length up front so it is not regrown
+        # chunk by chunk; compressed bodies decode to a different size
+        try:
+            expected = int(response.headers.get("Content-Length") or 0)
+        except (TypeError, ValueError):
+            expected = 0
+        if response.headers.get("Content-Encoding"):
+            expected = 0
+
+        # Get audio content; reading to the end returns the connection to the pool
+        buffer = bytearray(expected)
+        size = 0
+        try:
+            for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                # Slice assignment overwrites in place and grows only past the end
+                buffer[size : size + len(chunk)] = chunk
+                size += len(chunk)
+        except requests.exceptions.ConnectionError as e:
+            # requests wraps a read timeout during body download as a
+            # ConnectionError; report it as the timeout it is
+            if e.args and isinstance(e.args[0], ReadTimeoutError):
+                raise requests.exceptions.ReadTimeout(e) from e
+            raise
+        del buffer[size:]
+        audio_content = bytes(buffer)
+        if not audio_content:
+            raise Exception("Empty response from TTS service")
+
+        logger.info(
+            "TTS synthesis successful, audio size: %d bytes", len(audio_content)
+        )
+
+        return audio_content
+
+    def _split_text(
+        self, text: str, max_chars: int = PARALLEL_CHUNK_CHARS
+    ) -> list[str]:
+        """
+        Split text into chunks of whole sentences no longer than max_chars
+        """
+        chunks = []
+        current = ""
+        for sentence in _SENTENCE_END_RE.split(text):
+            # A single sentence longer than the limit is cut at a word boundary
+            while len(sentence) > max_chars:
+                if current:
+                    chunks.append(current)
+                    current = ""
+                cut = sentence.rfind(" ", 0, max_chars)
+                if cut <= 0:
+                    cut = max_chars
+                chunks.append(sentence[:cut])
+                sentence = sentence[cut:].lstrip()
+
+            if current and len(current) + 1 + len(sentence) > max_chars:
+                chunks.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}" if current else sentence
+
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _synthesize_long(self, api_key: str, params: dict[str, str]) -> bytes:
+        """
+        Synthesize long plain text as parallel sentence chunks joined in order
+        """
+        # SSML markup cannot be split safely, and concatenated Ogg pages would
+        # need their granule positions rewritten, so only plain MP3 is split
+        if params["format"] != "mp3" or _is_ssml(params["text"]):
+            return self._synthesize(api_key, params)
+
+        chunks = self._split_text(params["text"])
+        if len(chunks) < 2:
+            return self._synthesize(api_key, params)
+
+        logger.info("Synthesizing %d text chunks in parallel", len(chunks))
+        pool = ThreadPoolExecutor(max_workers=min(PARALLEL_MAX_WORKERS, len(chunks)))
+        try:
+            parts = list(
+                pool.map(
+                    lambda chunk: self._synthesize(api_key, {**params, "text": chunk}),
+                    chunks,
+                )
+            )
+            failure = None
+        except SynthesisAPIError as e:
+            # Auth, quota and parameter errors would fail the same way again
+            if e.status_code < 500:
+                raise
+            failure = e
+        except requests.exceptions.RequestException as e:
+            failure = e
+        finally:
+            # Do not send the chunks still queued once one of them has failed
+            pool.shutdown(cancel_futures=True)
+
+        if failure is not None:
+            logger.warning(
+                f"Parallel synthesis failed, retrying as one request: {failure}"
+            )
+            return self._synthesize(api_key, params)
+
+        # MP3 frames can be concatenated without re-encoding
+        return b"".join(parts)
+
+    def _synthesize_cached(self, api_key: str, params: dict[str, str]) -> bytes:
+        """
+        Return audio for validated parameters, synthesizing it on a cache miss
+        """
+        ext = self.FORMAT_INFO[params["format"]][1]
+        cache_key = tts_cache.make_key(params, api_key)
+        audio_content = tts_cache.get(cache_key, ext)
+        if audio_content is not None:
+            logger.info("TTS cache hit, audio size: %d bytes", len(audio_content))
+            return audio_content
+
+        if len(params["text"]) > PARALLEL_CHUNK_CHARS:
+            audio_content = self._synthesize_long(api_key, params)
+        else:
+            audio_content = self._synthesize(api_key, params)
+        tts_cache.put(cache_key, ext, audio_content)
+        return audio_content
+
+    async def _synthesize_many_async(
+        self, tool_parameters_list: list[dict[str, Any]]
+    ) -> list[bytes]:
+        """
+        Synthesize a batch of texts concurrently, returning audio in input order.
+        Entry point for callers that already run an event loop; cache and
+        network I/O run in worker threads so the loop is never blocked.
+        """
+        api_key = self.runtime.credentials.get("api_key")
+        if not api_key:
+            raise Exception("API key is required")
+
+        try:
+            params_list = [self._validate_parameters(p) for p in tool_parameters_list]
+        except ValueError as e:
+            raise Exception(f"Parameter error: {str(e)}")
+
+        semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+        async def synthesize_one(params: dict[str, str]) -> bytes:
+            async with semaphore:
+                return await asyncio.to_thread(self._synthesize_cached, api_key, params)
+
+        return list(await asyncio.gather(*map(synthesize_one, params_list)))
+
     def _invoke(
         self, tool_parameters: dict[str, Any]
     ) -> Generator[ToolInvokeMessage, None, None]:
@@ -116,85 +448,34 @@ class TextToSpeechTool(Tool):
             except ValueError as e:
                 raise Exception(f"Parameter error: {str(e)}")
 
-            # Log synthesis parameters
-            logger.info(
-                f"TTS synthesis - text: '{params['text'][:50]}...', "
-                f"voice: {params['voice']}, emotion: {params['emotion']}, "
-                f"speed: {params['speed']}, format: {params['format']}"
-            )
-
-            # Prepare API request
-            url = "https://tts.api.cloud.yandex.net/speech/v1/tts:synthesize"
-            headers = {"Authorization": f"Api-Key {api_key}"}
-
-            # Prepare request data
-            data = {
-                # SSML support for v1: if text looks like SSML, use 'ssml' param
-                (
-                    "ssml" if params["text"].lstrip().startswith("<speak") else "text"
-                ): params["text"],
-                "voice": params["voice"],
-                "speed": params["speed"],
-                "format": params["format"],
-                "lang": "ru-RU",
-            }
-            # Add emotion only if not neutral or explicitly supported
-            if params["emotion"] != "neutral":
-                data["emotion"] = params["emotion"]
-
-            # Make API request
-            response = requests.post(url, headers=headers, data=data, timeout=30)
-
-            logger.info(f"API response status: {response.status_code}")
-
-            if response.status_code != 200:
-                error_msg = f"API error: {response.status_code}"
-                try:
-                    error_data = response.json()
-                    # Normalize different shapes
-                    nested = (
-                        error_data.get("error")
-                        if isinstance(error_data, dict)
-                        else None
-                    )
-                    if isinstance(nested, dict):
-                        code = nested.get("code") or nested.get("error_code")
-                        msg = nested.get("message") or nested.get("error_message")
-                    else:
-                        code = error_data.get("error_code") or error_data.get("code")
-                        msg = error_data.get("message") or error_data.get(
-                            "error_message"
-                        )
-                    # Fallback to details if present
-                    if not msg:
-                        details = error_data.get("details")
-                        if isinstance(details, (list, dict)):
-                            msg = str(details)[:200]
-                    if code:
-                        error_msg += f" [{code}]"
-                    if msg:
-                        error_msg += f" - {msg}"
-                except Exception:
-                    body = (response.text or "")[:200]
-                    error_msg += f" - {body}"
-
-                # Append params context to help debugging
-                error_msg += (
-                    f" | voice={params['voice']}, emotion={params['emotion']}, "
-                    f"speed={params['speed']}, format={params['format']}"
+            # Log synthesis parameters; skip the text slice when INFO is off
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(
+                    "TTS synthesis - text: '%s...', voice: %s, emotion: %s, "
+                    "speed: %s, format: %s",
+                    params["text"][:50],
+                    params["voice"],
+                    params["emotion"],
+                    params["speed"],
+                    params["format"],
                 )
 
-                logger.error(error_msg)
-                raise Exception(error_msg)
-
-            # Get audio content
-            audio_content = response.content
-            if not audio_content:
-                raise Exception("Empty response from TTS service")
+            mime_type, ext, format_name = self.FORMAT_INFO[params["format"]]
 
-            logger.info(
-                f"TTS synthesis successful, audio size: {len(audio_content)} bytes"
+            # Return structured variables: first named variable 'params', then file with 'file' name
+            summary = self.create_json_message(
+                {
+                    "voice": params["voice"],
+                    "emotion": params["emotion"],
+                    "speed": params["speed"],
+                    "format": format_name,
+                    "text_length": len(params["text"]),
+                },
             )
+            meta = {"mime_type": mime_type, "filename": f"speech.{ext}"}
+
+            # Serve repeated syntheses from the audio cache
+            audio_content = self._synthesize_cached(api_key, params)
 
             # Create result message
             result_text = (
@@ -208,30 +489,10 @@ class TextToSpeechTool(Tool):
                 f"• Audio size: {len(audio_content)} bytes"
             )
 
-            # Return structured variables: first named variable 'params', then file with 'file' name
-            yield self.create_json_message(
-                {
-                    "voice": params["voice"],
-                    "emotion": params["emotion"],
-                    "speed": params["speed"],
-                    "format": (
-                        "opus" if params["format"] == "oggopus" else params["format"]
-                    ),
-                    "text_length": len(params["text"]),
-                },
-            )
+            yield summary
 
             # Return file as blob (goes to default 'files' array)
-            ext = "ogg" if params["format"] == "oggopus" else params["format"]
-            yield self.create_blob_message(
-                blob=audio_content,
-                meta={
-                    "mime_type": self.FORMAT_MIME.get(
-                        params["format"], "application/octet-stream"
-                    ),
-                    "filename": f"speech.{ext}",
-                },
-            )
+            yield self.create_blob_message(blob=audio_content, meta=meta)
 
         except requests.exceptions.Timeout:
             logger.error("TTS request timeout")